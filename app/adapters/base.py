@@ -1,3 +1,8 @@
+from typing import AsyncIterator
+
 class BaseAdapter:
-    def generate(self, prompt: str, model: str = None, max_tokens: int = 512, temperature: float = 0.0) -> str:
+    async def agenerate(self, prompt: str, model: str = None, max_tokens: int = 512, temperature: float = 0.0) -> str:
+        raise NotImplementedError
+
+    def agenerate_stream(self, prompt: str, model: str = None, max_tokens: int = 512, temperature: float = 0.0) -> AsyncIterator[str]:
         raise NotImplementedError
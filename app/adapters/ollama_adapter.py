@@ -1,36 +1,225 @@
 import os
-import requests
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+import orjson
+from app.cache import LLMCache
 from .base import BaseAdapter
 
+# Resolved once at import; these don't change while the process runs
+_DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+_API_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+# Ollama runs a limited number of generations per model at once; queue the rest here
+# instead of piling them up on the server (matches the server's OLLAMA_NUM_PARALLEL)
+MAX_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Optional runtime tuning passed through to Ollama's "options"; unset means Ollama's default
+_TUNING_OPTIONS = {
+    name: int(os.environ[env])
+    for name, env in (
+        ("num_ctx", "OLLAMA_NUM_CTX"),
+        ("num_batch", "OLLAMA_NUM_BATCH"),
+        ("num_thread", "OLLAMA_NUM_THREAD"),
+    )
+    if os.getenv(env)
+}
+
+# Shared client settings: keep connections to Ollama alive between requests
+# instead of paying a fresh TCP handshake on every call.
+HTTP_TIMEOUT = httpx.Timeout(180, connect=10)
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30)
+# HTTP/2 multiplexes concurrent requests over one connection. httpx only negotiates it
+# over TLS (e.g. behind an h2 proxy); plain http:// to Ollama stays on HTTP/1.1.
+# Set OLLAMA_HTTP2=0 if a proxy in front of Ollama mishandles h2.
+HTTP2 = os.getenv("OLLAMA_HTTP2", "1") != "0"
+
+# Keep the model loaded between requests so calls don't pay a reload
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# "httpx" (default) or "rusty" for the optional Rust-backed rusty_req client.
+# Only non-streaming POSTs use rusty_req; streaming always goes through httpx.
+# Resolved here so a bad value or a missing package fails at startup, not per request.
+HTTP_BACKEND = os.getenv("OLLAMA_HTTP_BACKEND", "httpx").strip().lower()
+if HTTP_BACKEND not in ("httpx", "rusty"):
+    raise ValueError(f"Unknown OLLAMA_HTTP_BACKEND {HTTP_BACKEND!r}; expected 'httpx' or 'rusty'")
+rusty_req = None
+if HTTP_BACKEND == "rusty":
+    try:
+        import rusty_req
+    except ImportError as e:
+        raise ImportError("OLLAMA_HTTP_BACKEND=rusty needs the rusty-req package (pip install rusty-req)") from e
+
+# Bodies are pre-encoded with orjson, so the content type is set explicitly
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Prefix used for error strings returned in place of a model response
+ERROR_PREFIX = "[OllamaAdapter ERROR]"
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build the pooled async HTTP client used to talk to Ollama.
+    """
+    return httpx.AsyncClient(http2=HTTP2, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+
 class OllamaAdapter(BaseAdapter):
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMCache] = None, client: Optional[httpx.AsyncClient] = None):
         # Default model if none provided
-        self.default_model = os.getenv("OLLAMA_MODEL", "llama3")
+        self.default_model = _DEFAULT_MODEL
         # Ensure the URL points to your running Ollama API
-        self.api_url = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+        self.api_url = _API_URL
+        # Embeddings live next to /api/generate on the same server
+        self.embed_url = self.api_url.rsplit("/api/", 1)[0] + "/api/embed"
+        self.embed_model = _EMBED_MODEL
+        # Pooled client kept for the adapter's lifetime; close it with aclose()
+        self.client = client or create_http_client()
+        # Optional exact-match response cache (temperature == 0 only)
+        self.cache = cache
+        # One semaphore per model bounds in-flight generations; each entry also counts
+        # its holders and waiters so it can be dropped once the model goes idle
+        self._model_limits: Dict[str, Tuple[asyncio.Semaphore, List[int]]] = {}
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
 
-    def generate(self, prompt: str, model: str = None, max_tokens: int = 1200, temperature: float = 0.0) -> str:
+    async def _post(self, url: str, payload: dict) -> dict:
         """
-        Calls the Ollama API to generate a response for a given prompt.
+        POSTs a JSON payload and returns the decoded JSON body.
+        Raises on connection or HTTP errors.
         """
-        payload = {
-            "model": model or self.default_model,
+        if HTTP_BACKEND == "rusty":
+            return await self._post_rusty(url, payload)
+        response = await self.client.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def _post_rusty(self, url: str, payload: dict) -> dict:
+        result = await rusty_req.fetch_single(
+            url=url, method="POST", params=payload, timeout=HTTP_TIMEOUT.read, headers=JSON_HEADERS
+        )
+        # rusty_req reports failures in-band and returns nested fields as JSON strings
+        error = orjson.loads(result["exception"])
+        if error:
+            raise RuntimeError(f"{error.get('type')}: {error.get('message')}")
+        return orjson.loads(orjson.loads(result["response"])["content"])
+
+    @asynccontextmanager
+    async def _model_limit(self, model: str) -> AsyncIterator[None]:
+        # Entries exist only while a call for the model is running or waiting, so
+        # arbitrary client-supplied model names can't grow the dict without bound.
+        if model not in self._model_limits:
+            self._model_limits[model] = (asyncio.Semaphore(MAX_PARALLEL), [0])
+        semaphore, users = self._model_limits[model]
+        users[0] += 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            users[0] -= 1
+            if users[0] == 0:
+                del self._model_limits[model]
+
+    def _payload(self, model: str, prompt: str, max_tokens: int, temperature: float, stream: bool) -> dict:
+        return {
+            "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": stream,
+            "keep_alive": KEEP_ALIVE,
             "options": {
+                **_TUNING_OPTIONS,
                 "temperature": temperature,
                 "num_predict": max_tokens
             }
         }
 
+    async def agenerate(self, prompt: str, model: str = None, max_tokens: int = 1200, temperature: float = 0.0) -> str:
+        """
+        Calls the Ollama API to generate a response for a given prompt.
+        """
+        model = model or self.default_model
+        key = self.cache.cache_key(model, prompt, temperature, max_tokens) if self.cache else None
+        if key:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        payload = self._payload(model, prompt, max_tokens, temperature, stream=False)
+
         try:
-            response = requests.post(self.api_url, json=payload, timeout=180)
-            response.raise_for_status()
-            data = response.json()
-            # Ollama API returns response in 'response' key
-            return data.get("response", "").strip()
+            async with self._model_limit(model):
+                data = await self._post(self.api_url, payload)
+            # Ollama API returns response in 'response' key; skip strip() when it's empty
+            text = data.get("response")
+            text = text.strip() if text else ""
         except Exception as e:
-            return f"[OllamaAdapter ERROR] {e}"
+            return f"{ERROR_PREFIX} {e}"
+
+        if key:
+            await self.cache.set(key, text)
+        return text
+
+    async def awarm(self, prompt: str, model: str = None) -> bool:
+        """
+        Loads the model and prefills a prompt so Ollama holds its KV cache.
+        Later requests that start with the same text skip that prefill.
+        Never raises; returns False if Ollama couldn't be reached.
+        """
+        model = model or self.default_model
+        payload = self._payload(model, prompt, max_tokens=1, temperature=0.0, stream=False)
+        try:
+            async with self._model_limit(model):
+                await self._post(self.api_url, payload)
+        except Exception:
+            return False
+        return True
+
+    async def agenerate_stream(self, prompt: str, model: str = None, max_tokens: int = 1200, temperature: float = 0.0) -> AsyncIterator[str]:
+        """
+        Streams the response text chunk by chunk as Ollama produces it.
+        A cached answer is yielded whole; a completed stream is added to the cache.
+        """
+        model = model or self.default_model
+        key = self.cache.cache_key(model, prompt, temperature, max_tokens) if self.cache else None
+        if key:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        payload = self._payload(model, prompt, max_tokens, temperature, stream=True)
+        parts = []
+        done = False
+        try:
+            async with self._model_limit(model), self.client.stream(
+                "POST", self.api_url, content=orjson.dumps(payload), headers=JSON_HEADERS
+            ) as response:
+                response.raise_for_status()
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = orjson.loads(line)
+                    chunk = data.get("response", "")
+                    if chunk:
+                        parts.append(chunk)
+                        yield chunk
+                    done = data.get("done", False)
+        except Exception as e:
+            yield f"{ERROR_PREFIX} {e}"
+            return
+
+        if key and done:
+            await self.cache.set(key, "".join(parts).strip())
+
+    async def aembed(self, texts: List[str], model: str = None) -> List[List[float]]:
+        """
+        Calls the Ollama embed API and returns one vector per input text.
+        Raises on HTTP errors so callers can fall back to a normal generation.
+        """
+        payload = {"model": model or self.embed_model, "input": texts}
+        return (await self._post(self.embed_url, payload))["embeddings"]
 
 # Utility function for direct queries (optional)
 def query_model(model: str, prompt: str):
@@ -38,10 +227,10 @@ def query_model(model: str, prompt: str):
     Standalone function to call Ollama API directly if needed.
     """
     try:
-        url = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
-        payload = {"model": model, "prompt": prompt, "stream": False}
-        response = requests.post(url, json=payload, timeout=180)
+        url = _API_URL
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": KEEP_ALIVE}
+        response = httpx.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     except Exception as e:
         return {"error": str(e)}
@@ -0,0 +1,104 @@
+# app/batcher.py
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+BatchFn = Callable[[List[Any]], Awaitable[List[Any]]]
+
+# -----------------------------
+# Async Micro-Batcher
+# -----------------------------
+class AsyncBatcher:
+    """
+    Collects concurrent single-item calls and sends them to `fn` as one batch.
+
+    A background task waits for the first item, then keeps draining the queue
+    for up to `batch_window_ms` or until `max_batch` items are collected. Each
+    batch is sent in its own task, so a slow call doesn't hold up the batches
+    behind it. Each caller awaits its own future, which receives the result at
+    its position.
+    """
+    def __init__(self, fn: BatchFn, max_batch: int = 32, batch_window_ms: float = 8):
+        self._fn = fn
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000
+        self._queue: asyncio.Queue[Tuple[Any, asyncio.Future]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Strong references to in-flight batches so they aren't garbage collected
+        self._inflight: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Nothing will serve what's still queued; fail it instead of leaving callers hanging
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("batcher stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self._fn([item for item, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("batcher stopped"))
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        # zip() stops at the shorter list; don't leave the remaining callers hanging
+        if len(results) != len(batch):
+            error = RuntimeError(f"batch returned {len(results)} results for {len(batch)} items")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+
+def create_embed_batcher(fn: BatchFn) -> AsyncBatcher:
+    """
+    Build the embedding batcher from environment settings.
+    """
+    return AsyncBatcher(
+        fn,
+        max_batch=int(os.getenv("EMBED_BATCH_SIZE", 32)),
+        batch_window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", 8)),
+    )
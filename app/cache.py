@@ -0,0 +1,119 @@
+# app/cache.py
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+DEFAULT_TTL = 3600
+
+# -----------------------------
+# Backends
+# -----------------------------
+class MemoryBackend:
+    """
+    In-process LRU cache with per-entry expiry.
+    """
+    def __init__(self, maxsize: int = 2048, ttl: int = DEFAULT_TTL):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return self._data.get(key)
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        async with self._lock:
+            self._data[key] = value
+
+    async def close(self) -> None:
+        pass
+
+class RedisBackend:
+    """
+    Shared cache stored in Redis, so several API workers can reuse each other's answers.
+    """
+    def __init__(self, url: str, prefix: str = "netcop:llm:"):
+        from redis import asyncio as aioredis
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self._prefix + key)
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        await self._redis.set(self._prefix + key, value, ex=ttl)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+# -----------------------------
+# LLM Response Cache
+# -----------------------------
+class LLMCache:
+    """
+    Exact-match cache for model responses.
+
+    Only deterministic calls (temperature == 0) are cached; anything else
+    gets no key and always goes to the model.
+    """
+    def __init__(self, backend=None, ttl: int = DEFAULT_TTL):
+        self.backend = backend or MemoryBackend(ttl=ttl)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def cache_key(model: str, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
+        if temperature != 0:
+            return None
+        raw = json.dumps(
+            {"model": model, "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens},
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        # Fail open: a broken backend (e.g. Redis down) must not break generation.
+        # Backend errors are counted separately, not as misses.
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception:
+            self.errors += 1
+
+    async def close(self) -> None:
+        try:
+            await self.backend.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+def create_cache() -> LLMCache:
+    """
+    Build the response cache from environment settings.
+
+    REDIS_URL selects the Redis backend; otherwise an in-memory LRU is used.
+    """
+    ttl = int(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL))
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        return LLMCache(RedisBackend(redis_url), ttl=ttl)
+    maxsize = int(os.getenv("LLM_CACHE_SIZE", 2048))
+    return LLMCache(MemoryBackend(maxsize=maxsize, ttl=ttl), ttl=ttl)
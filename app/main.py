@@ -1,17 +1,55 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
-from app.adapters.ollama_adapter import OllamaAdapter
-from app.prompts import networking_prompt, code_generation_prompt
+from app.adapters.ollama_adapter import ERROR_PREFIX, MAX_PARALLEL, OllamaAdapter
+from app.batcher import create_embed_batcher
+from app.cache import create_cache
+from app.semantic_cache import create_semantic_cache
+from app.prompts import CODE_GENERATION_PREFIX, networking_prompt, code_generation_prompt
 from app.utils import run_code, analyze_code
 
-app = FastAPI(title="Network Copilot API")
+# -----------------------------
+# Prompt Cache Warm-up
+# -----------------------------
+async def warm_prompt_cache(adapter: OllamaAdapter):
+    # Prefill the shared instruction prefixes once so the first real calls find
+    # them in Ollama's KV cache. A single-slot server keeps only the last prompt,
+    # so the /generate_code prefix is warmed only when there are several slots,
+    # and the hot /ask prefix always goes last.
+    if MAX_PARALLEL > 1:
+        await adapter.awarm(CODE_GENERATION_PREFIX)
+    await adapter.awarm(networking_prompt(""))
 
 # -----------------------------
-# Adapter
+# Lifespan (shared adapter + response caches)
 # -----------------------------
-def get_adapter():
-    return OllamaAdapter()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One adapter (and one HTTP connection pool) for the whole process
+    app.state.adapter = OllamaAdapter(cache=create_cache())
+    # Concurrent /ask embeddings are sent to Ollama as one /api/embed call
+    app.state.embed_batcher = create_embed_batcher(app.state.adapter.aembed)
+    app.state.embed_batcher.start()
+    app.state.semantic_cache = create_semantic_cache(app.state.embed_batcher.submit)
+    # Warm in the background so startup doesn't wait on model loading
+    warmup = None
+    if os.getenv("OLLAMA_WARMUP", "1") != "0":
+        warmup = asyncio.create_task(warm_prompt_cache(app.state.adapter))
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        app.state.semantic_cache.save()
+        await app.state.embed_batcher.stop()
+        await app.state.adapter.aclose()
+        await app.state.adapter.cache.close()
+
+app = FastAPI(title="Network Copilot API", lifespan=lifespan)
 
 # -----------------------------
 # Request Schemas
@@ -24,6 +62,7 @@ class AskRequest(BaseModel):
     query: str
     model: Optional[str] = "llama3"
     messages: Optional[List[Message]] = None
+    max_tokens: int = Field(700, ge=1)
 
 class CodeGenRequest(BaseModel):
     task: str
@@ -40,36 +79,91 @@ class CodeRequest(BaseModel):
     code: str
     model: str = "llama3"  # default
 
+# -----------------------------
+# Response Schemas
+# -----------------------------
+# Declared response models let FastAPI serialize straight to JSON bytes via Pydantic.
+class RunCodeResponse(BaseModel):
+    compile_output: str
+    run_output: str
+    exit_code: int
+
+class Analysis(BaseModel):
+    what_it_does: str
+    security_issues: List[str]
+    suggestions: List[str]
+
+class AnalyzeResponse(BaseModel):
+    analysis: Analysis
+    compile_output: str
+    run_output: str
+    exit_code: int
+
+class AskResponse(BaseModel):
+    answer: str
+    model_used: str
+    mode: str
+
+class CodeGenResponse(BaseModel):
+    language: str
+    model_used: str
+    generated_code: str
+
+class MetricsResponse(BaseModel):
+    llm_cache: Dict[str, int]
+    semantic_cache: Dict[str, int]
+
+class RootResponse(BaseModel):
+    message: str
+
 # -----------------------------
 # Endpoints
 # -----------------------------
-@app.post("/run_code")
+@app.post("/run_code", response_model=RunCodeResponse)
 async def run_code_endpoint(req: CodeRequest):
-    return run_code(req.language, req.code)
+    return await run_code(req.language, req.code)
 
-@app.post("/analyze_code")
-async def analyze_code_endpoint(req: AnalyzeRequest):
-    return analyze_code(req.language, req.code, req.model)
-
-@app.post("/ask")
-def ask(req: AskRequest):
-    adapter = get_adapter()
+@app.post("/analyze_code", response_model=AnalyzeResponse)
+async def analyze_code_endpoint(req: AnalyzeRequest, request: Request):
+    return await analyze_code(req.language, req.code, request.app.state.adapter, req.model)
 
+def build_ask_prompt(req: AskRequest) -> str:
     # Handle both chat-style input and single query
     if req.messages and len(req.messages) > 0:
         # Combine the conversation context properly
         conversation_context = "\n".join(
             [f"{msg.role.capitalize()}: {msg.content}" for msg in req.messages]
         )
-        prompt = f"{conversation_context}\nUser: {req.query}\nAssistant:"
-    else:
-        # Default to networking question mode
-        prompt = networking_prompt(req.query)
+        return f"{conversation_context}\nUser: {req.query}\nAssistant:"
+    # Default to networking question mode
+    return networking_prompt(req.query)
+
+def answer_token_budget(req: AskRequest) -> int:
+    # Short questions rarely need long answers; don't let the model run on
+    return min(req.max_tokens, 256 if len(req.query) < 200 else 700)
+
+@app.post("/ask", response_model=AskResponse)
+async def ask(req: AskRequest, request: Request):
+    adapter = request.app.state.adapter
+    prompt = build_ask_prompt(req)
+
+    # Paraphrased single questions can reuse an earlier answer
+    semantic_cache = request.app.state.semantic_cache
+    model = req.model or adapter.default_model
+    max_tokens = answer_token_budget(req)
+    vector = None
+    if not req.messages:
+        cached, vector = await semantic_cache.lookup(model, max_tokens, req.query)
+        if cached is not None:
+            return {"answer": cached, "model_used": req.model or "default", "mode": "ask"}
 
     try:
-        resp = adapter.generate(prompt, model=req.model, max_tokens=700)
+        resp = await adapter.agenerate(prompt, model=req.model, max_tokens=max_tokens)
     except Exception as e:
         resp = f"[Error generating response] {str(e)}"
+    else:
+        if vector is not None and not resp.startswith(ERROR_PREFIX):
+            await semantic_cache.store(model, max_tokens, vector, resp)
 
     return {
         "answer": resp,
@@ -77,13 +171,23 @@ def ask(req: AskRequest):
         "mode": "chat" if req.messages else "ask"
     }
 
-@app.post("/generate_code")
-def generate_code(req: CodeGenRequest):
-    adapter = get_adapter()
+@app.post("/ask_stream")
+async def ask_stream(req: AskRequest, request: Request):
+    adapter = request.app.state.adapter
+    prompt = build_ask_prompt(req)
+    return StreamingResponse(
+        adapter.agenerate_stream(prompt, model=req.model, max_tokens=answer_token_budget(req)),
+        media_type="text/plain; charset=utf-8",
+    )
+
+@app.post("/generate_code", response_model=CodeGenResponse)
+async def generate_code(req: CodeGenRequest, request: Request):
+    adapter = request.app.state.adapter
     prompt = code_generation_prompt(req.task, req.language)
-    raw_code = adapter.generate(prompt, model=req.model, max_tokens=1200)
+    raw_code = await adapter.agenerate(prompt, model=req.model, max_tokens=1200)
 
-    formatted_code = [line for line in raw_code.splitlines() if line.strip() != ""]
+    # One string (blank lines dropped) instead of a list of lines; clients can split on "\n"
+    formatted_code = "\n".join(filter(None, (line.rstrip() for line in raw_code.splitlines())))
 
     return {
         "language": req.language,
@@ -91,6 +195,13 @@ def generate_code(req: CodeGenRequest):
         "generated_code": formatted_code
     }
 
-@app.get("/")
+@app.get("/metrics", response_model=MetricsResponse)
+def metrics(request: Request):
+    return {
+        "llm_cache": request.app.state.adapter.cache.stats(),
+        "semantic_cache": request.app.state.semantic_cache.stats(),
+    }
+
+@app.get("/", response_model=RootResponse)
 def root():
     return {"message": "🚀 Network Copilot API (Ollama) is running. Visit /docs for the endpoints."}
@@ -1,23 +1,39 @@
+# Templates are built once at import; each call only substitutes the fields.
+#
+# Every template starts with a fixed instruction block and puts the request
+# specific text last. Ollama reuses its KV cache for an identical token prefix,
+# so keeping the variable parts at the end lets repeated calls skip prefilling
+# the shared instructions.
+NETWORKING_PREFIX = (
+    "You are a helpful network engineer assistant. Answer concisely and precisely. "
+    "If code is requested, respond with working code only (no long explanation) and indicate required imports and steps."
+)
+_NETWORKING_TMPL = NETWORKING_PREFIX + "\n\nQuestion:\n{query}"
+
+CODE_GENERATION_PREFIX = (
+    "You are a pragmatic developer assistant. Produce code in the requested language that solves the task below. "
+    "Return only code (no markdown). If multiple files are needed, show them separated by comments.\n\n"
+    "Requirements: create robust, error-handled, runnable code. Keep it minimal but complete."
+)
+_CODE_GENERATION_TMPL = CODE_GENERATION_PREFIX + "\n\nLANGUAGE: {language}\nTASK:\n{task}"
+
+ANALYZE_CODE_PREFIX = (
+    "You are a senior engineer and teacher. The user has the code below. "
+    "Analyze it, point out bugs and security issues, and provide a corrected version. "
+    "Explain briefly why you changed things.\n"
+    "Produce: 1) Short diagnosis (1-5 sentences). 2) Fixed code (only code fenced block or plain code). 3) Short explanation of fixes."
+)
+_ANALYZE_CODE_TMPL = ANALYZE_CODE_PREFIX + "\n\nLANGUAGE: {language}\nUSER CODE:\n{code}"
+_COMPILE_OUTPUT_TMPL = "\n\nCOMPILER / LINTER OUTPUT:\n{compile_output}"
+
 def networking_prompt(query: str) -> str:
-    return f"You are a helpful network engineer assistant. Answer concisely and precisely. If code is requested, respond with working code only (no long explanation) and indicate required imports and steps.\n\nQuestion:\n{query}"
+    return _NETWORKING_TMPL.format_map({"query": query})
 
 def code_generation_prompt(task: str, language: str) -> str:
-    return (
-        f"You are a pragmatic developer assistant. Produce {language} code that solves the task below. "
-        "Return only code (no markdown). If multiple files are needed, show them separated by comments.\n\n"
-        f"TASK:\n{task}\n\n"
-        "Requirements: create robust, error-handled, runnable code. Keep it minimal but complete."
-    )
+    return _CODE_GENERATION_TMPL.format_map({"task": task, "language": language})
 
 def analyze_code_prompt(language: str, code: str, compile_output: str | None = None) -> str:
-    s = (
-        f"You are a senior engineer and teacher. The user has the following {language} code. "
-        "Analyze it, point out bugs and security issues, and provide a corrected version. "
-        "Explain briefly why you changed things.\n\n"
-        "USER CODE:\n"
-        f"{code}\n\n"
-    )
+    s = _ANALYZE_CODE_TMPL.format_map({"language": language, "code": code})
     if compile_output:
-        s += f"COMPILER / LINTER OUTPUT:\n{compile_output}\n\n"
-    s += "Now produce: 1) Short diagnosis (1-5 sentences). 2) Fixed code (only code fenced block or plain code). 3) Short explanation of fixes."
+        s += _COMPILE_OUTPUT_TMPL.format_map({"compile_output": compile_output})
     return s
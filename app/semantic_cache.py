@@ -0,0 +1,181 @@
+# app/semantic_cache.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+EmbedFn = Callable[[str], Awaitable[List[float]]]
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Semantic (Embedding) Cache
+# -----------------------------
+class SemanticCache:
+    """
+    Returns a stored answer when a new query is close enough to one already answered.
+
+    Queries are embedded, L2-normalized and compared by inner product (cosine
+    similarity) against every stored query for the same model and token budget
+    (so a deliberately short answer isn't served to a longer request). The threshold is
+    deployment specific: too low and unrelated questions share answers.
+    Entries older than `ttl` seconds are ignored, including ones loaded from disk.
+
+    Entries live in a preallocated ring buffer of `maxsize` rows, so an insert
+    writes one row in place instead of copying the whole matrix; once full,
+    the oldest entry is overwritten.
+    """
+    def __init__(self, embed: EmbedFn, threshold: float = 0.92, path: Optional[str] = None,
+                 maxsize: int = 5000, ttl: int = 3600, embed_timeout: float = 2.0):
+        self._embed = embed
+        # A slow embedding counts as a miss so the request falls back to normal generation
+        self.embed_timeout = embed_timeout
+        self.threshold = threshold
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._reset(dim=None)
+
+    def _reset(self, dim: Optional[int]) -> None:
+        # Rows [0, _count) are filled; _cursor is the next row to write
+        self._vectors: Optional[np.ndarray] = None if dim is None else np.zeros((self.maxsize, dim), dtype=np.float32)
+        self._created = np.full(self.maxsize, -np.inf)
+        self._models: List[Optional[str]] = [None] * self.maxsize
+        self._budgets: List[Optional[int]] = [None] * self.maxsize
+        self._responses: List[Optional[str]] = [None] * self.maxsize
+        self._cursor = 0
+        self._count = 0
+
+    async def lookup(self, model: str, max_tokens: int, query: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Returns (cached_response, query_vector). The vector is handed back so the
+        caller can store() the fresh answer without embedding the query twice.
+        Either value may be None if embedding fails or nothing matches.
+        """
+        try:
+            embedding = await asyncio.wait_for(self._embed(query), self.embed_timeout)
+            vector = _normalize(np.asarray(embedding, dtype=np.float32))
+        except Exception:
+            return None, None
+
+        async with self._lock:
+            if self._count and self._vectors.shape[1] == vector.shape[0]:
+                scores = self._vectors[:self._count] @ vector
+                scores[self._created[:self._count] < time.time() - self.ttl] = -np.inf
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for idx in candidates[np.argsort(scores[candidates])[::-1]]:
+                    if self._models[idx] == model and self._budgets[idx] == max_tokens:
+                        self.hits += 1
+                        return self._responses[idx], vector
+        self.misses += 1
+        return None, vector
+
+    async def store(self, model: str, max_tokens: int, vector: np.ndarray, response: str) -> None:
+        async with self._lock:
+            self._insert(model, max_tokens, vector, response, time.time())
+
+    def _insert(self, model: str, max_tokens: int, vector: np.ndarray, response: str, created: float) -> None:
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            self._reset(dim=vector.shape[0])
+        idx = self._cursor
+        self._vectors[idx] = vector
+        self._created[idx] = created
+        self._models[idx] = model
+        self._budgets[idx] = max_tokens
+        self._responses[idx] = response
+        self._cursor = (idx + 1) % self.maxsize
+        self._count = min(self._count + 1, self.maxsize)
+
+    def _live_rows(self) -> List[int]:
+        # Unexpired rows, oldest first
+        if self._count < self.maxsize:
+            order = range(self._count)
+        else:
+            order = [(self._cursor + i) % self.maxsize for i in range(self.maxsize)]
+        oldest = time.time() - self.ttl
+        return [idx for idx in order if self._created[idx] >= oldest]
+
+    def load(self) -> None:
+        """
+        Loads a saved index. The cache is best effort: an unreadable file is
+        logged and skipped so it can never keep the API from starting.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            self._load()
+        except Exception as e:
+            logger.warning("Ignoring unreadable semantic cache %s: %s", self.path, e)
+            self._reset(dim=None)
+
+    def _load(self) -> None:
+        with np.load(self.path) as data:
+            # Files written in an older layout are ignored
+            if "meta" not in data:
+                return
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if "max_tokens" not in meta:
+                return
+            vectors = data["vectors"].astype(np.float32)
+        self._reset(dim=None)
+        rows = zip(vectors, meta["models"], meta["max_tokens"], meta["responses"], meta["created"])
+        oldest = time.time() - self.ttl
+        for vector, model, max_tokens, response, created in rows:
+            if created >= oldest:
+                self._insert(model, max_tokens, vector, response, created)
+
+    def save(self) -> None:
+        if not self.path or self._vectors is None:
+            return
+        rows = self._live_rows()
+        # Text is stored as UTF-8 JSON bytes rather than a numpy string array,
+        # which would pad every entry to the longest response.
+        meta = json.dumps({
+            "models": [self._models[i] for i in rows],
+            "max_tokens": [self._budgets[i] for i in rows],
+            "responses": [self._responses[i] for i in rows],
+            "created": [float(self._created[i]) for i in rows],
+        })
+        vectors = self._vectors[rows]
+        # Write to a temp file next to the target and swap it in, so a process killed
+        # mid-save leaves the previous index intact rather than a truncated one.
+        # Writing through a file handle also stops np.savez appending ".npz".
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, vectors=vectors, meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def stats(self) -> dict:
+        live = int((self._created[:self._count] >= time.time() - self.ttl).sum())
+        return {"hits": self.hits, "misses": self.misses, "entries": live}
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def create_semantic_cache(embed: EmbedFn) -> SemanticCache:
+    """
+    Build the semantic cache from environment settings and load any saved index.
+    """
+    cache = SemanticCache(
+        embed,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92)),
+        path=os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.npz"),
+        maxsize=int(os.getenv("SEMANTIC_CACHE_SIZE", 5000)),
+        ttl=int(os.getenv("SEMANTIC_CACHE_TTL", os.getenv("LLM_CACHE_TTL", 3600))),
+        embed_timeout=float(os.getenv("SEMANTIC_CACHE_EMBED_TIMEOUT", 2.0)),
+    )
+    cache.load()
+    return cache
@@ -1,10 +1,15 @@
 # app/utils.py
+import asyncio
 import os
 import tempfile
 import subprocess
 import uuid
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+import aiofiles
+
+# Compiled once at import instead of on every request
+_JAVA_CLASS_RE = re.compile(r'public\s+class\s+([A-Za-z_][A-Za-z0-9_]*)')
 
 # -----------------------------
 # Code File Management
@@ -26,7 +31,7 @@ def save_code_to_tempfile(code: str, language: str, filename_hint: str | None =
     tmpdir = tempfile.mkdtemp(prefix="netcop_")
     
     if language.lower() == "java":
-        m = re.search(r'public\s+class\s+([A-Za-z_][A-Za-z0-9_]*)', code)
+        m = _JAVA_CLASS_RE.search(code)
         if m:
             fname = f"{m.group(1)}.java"
         elif filename_hint:
@@ -80,7 +85,36 @@ def python_syntax_check(py_path: str) -> Dict[str, Any]:
 # -----------------------------
 # Run Code
 # -----------------------------
-def run_code(language: str, code: str) -> Dict[str, Any]:
+# Scratch files go to tmpfs when available so writes never hit the disk
+_SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+# Python sources larger than this (in characters) skip the in-process syntax check
+_INPROCESS_COMPILE_LIMIT = 64_000
+
+async def _run_process(args: List[str], timeout: float) -> Tuple[int, str, str]:
+    """
+    Run a subprocess without blocking the event loop.
+
+    Returns (exit_code, stdout, stderr). A missing executable or a timeout is
+    reported through stderr with a non-zero exit code instead of raising.
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        return -1, "", f"{args[0]} not found on PATH."
+
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1, "", f"{args[0]} timed out after {timeout}s."
+
+    return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+async def run_code(language: str, code: str) -> Dict[str, Any]:
     """
     Run/compile code depending on the language and return structured output:
     
@@ -91,30 +125,41 @@ def run_code(language: str, code: str) -> Dict[str, Any]:
             "exit_code": int
         }
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
+    # Syntax errors are caught in-process; compile() only parses, it doesn't execute.
+    # Large inputs skip this so parsing can't stall the event loop, and inputs the
+    # parser can't cope with (too deep, too big) are left to the interpreter to report.
+    if language.lower().startswith("py") and len(code) <= _INPROCESS_COMPILE_LIMIT:
+        try:
+            compile(code, "<user>", "exec")
+        except (SyntaxError, ValueError) as e:
+            return {"compile_output": f"{type(e).__name__}: {e}", "run_output": "", "exit_code": 1}
+        except (MemoryError, RecursionError):
+            pass
+
+    with tempfile.TemporaryDirectory(dir=_SCRATCH_DIR) as tmpdir:
         if language.lower() == "java":
             file_path = os.path.join(tmpdir, "Main.java")
-            with open(file_path, "w") as f:
-                f.write(code)
+            async with aiofiles.open(file_path, "w") as f:
+                await f.write(code)
 
             # Compile Java
-            compile_proc = subprocess.run(["javac", file_path], capture_output=True, text=True)
-            if compile_proc.returncode != 0:
-                return {"compile_output": compile_proc.stderr, "run_output": "", "exit_code": compile_proc.returncode}
+            compile_rc, compile_out, compile_err = await _run_process(["javac", file_path], timeout=20)
+            if compile_rc != 0:
+                return {"compile_output": compile_err, "run_output": "", "exit_code": compile_rc}
 
             # Run Java
-            run_proc = subprocess.run(["java", "-cp", tmpdir, "Main"], capture_output=True, text=True)
-            return {"compile_output": compile_proc.stdout + compile_proc.stderr,
-                    "run_output": run_proc.stdout + run_proc.stderr,
-                    "exit_code": run_proc.returncode}
+            run_rc, run_out, run_err = await _run_process(["java", "-cp", tmpdir, "Main"], timeout=10)
+            return {"compile_output": compile_out + compile_err,
+                    "run_output": run_out + run_err,
+                    "exit_code": run_rc}
 
         elif language.lower().startswith("py"):
             file_path = os.path.join(tmpdir, "script.py")
-            with open(file_path, "w") as f:
-                f.write(code)
+            async with aiofiles.open(file_path, "w") as f:
+                await f.write(code)
 
-            run_proc = subprocess.run(["python", file_path], capture_output=True, text=True)
-            return {"compile_output": "", "run_output": run_proc.stdout + run_proc.stderr, "exit_code": run_proc.returncode}
+            run_rc, run_out, run_err = await _run_process(["python", file_path], timeout=10)
+            return {"compile_output": "", "run_output": run_out + run_err, "exit_code": run_rc}
 
         else:
             return {"compile_output": "", "run_output": f"Language {language} not supported.", "exit_code": -1}
@@ -122,6 +167,16 @@ def run_code(language: str, code: str) -> Dict[str, Any]:
 # -----------------------------
 # Parse LLM Analysis Response
 # -----------------------------
+# A "-", "*" or "1." marker in front of a header belongs to the header, not to the previous section
+_SECTION_RE = re.compile(
+    r'(?:^[ \t]*(?:[*-]|\d+\.)[ \t]*)?\*\*(What it does|Security issues|(?:Improvement )?[Ss]uggestions(?: for improvement)?):\*\*',
+    re.M,
+)
+# Non-empty lines, stripped; optionally without a "*"/"-" bullet or a "1." number
+_LINE_RE = re.compile(r'^[ \t]*(\S.*?)[ \t]*$', re.M)
+_BULLET_RE = re.compile(r'^[ \t]*(?:[*-][ \t]*)?(\S.*?)[ \t]*$', re.M)
+_NUMBERED_RE = re.compile(r'^[ \t]*(?:(?:[*-]|\d+\.)[ \t]*)?(\S.*?)[ \t]*$', re.M)
+
 def parse_analysis_response(text: str) -> Dict[str, Any]:
     """
     Converts raw LLM text analysis into structured JSON.
@@ -139,37 +194,17 @@ def parse_analysis_response(text: str) -> Dict[str, Any]:
         }
     """
     sections = {"what_it_does": "", "security_issues": [], "suggestions": []}
-    current_section = None
-
-    for line in text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-
-        # Detect section headers
-        if "**What it does:**" in line:
-            current_section = "what_it_does"
-            continue
-        elif "**Security issues:**" in line:
-            current_section = "security_issues"
-            continue
-        elif "**Improvement suggestions:**" in line or "**Suggestions for improvement:**" in line:
-            current_section = "suggestions"
-            continue
-
-        # Append content to appropriate section
-        if current_section == "what_it_does":
-            sections["what_it_does"] += line + " "
-        elif current_section == "security_issues":
-            if line.startswith(("*", "-")):
-                sections["security_issues"].append(line[1:].strip())
-            else:
-                sections["security_issues"].append(line)
-        elif current_section == "suggestions":
-            if line.startswith(("*", "-", "1.", "2.", "3.")):
-                sections["suggestions"].append(line.lstrip("*-1234567890. ").strip())
-            else:
-                sections["suggestions"].append(line)
+
+    # split() yields [preamble, header1, body1, header2, body2, ...];
+    # text before the first header is ignored.
+    parts = _SECTION_RE.split(text)
+    for header, body in zip(parts[1::2], parts[2::2]):
+        if header == "What it does":
+            sections["what_it_does"] += " ".join(_LINE_RE.findall(body)) + " "
+        elif header == "Security issues":
+            sections["security_issues"].extend(_BULLET_RE.findall(body))
+        else:
+            sections["suggestions"].extend(_NUMBERED_RE.findall(body))
 
     sections["what_it_does"] = sections["what_it_does"].strip()
     return sections
@@ -177,41 +212,41 @@ def parse_analysis_response(text: str) -> Dict[str, Any]:
 # -----------------------------
 # Analyze Code (LLM + Run)
 # -----------------------------
-from app.adapters.ollama_adapter import query_model
+from app.adapters.base import BaseAdapter
 
-def analyze_code(language: str, code: str, model: str = "llama3"):
-    """
-    Analyze code using the LLM and also run/compile it.
-    Returns structured JSON with analysis, compile output, run output, and exit code.
-    """
-    prompt = f"""
-You are a code analyzer. Analyze the following {language} code:
+# Fixed instructions first, request-specific text last (see app/prompts.py)
+_ANALYZER_TMPL = """
+You are a code analyzer. Analyze the code below:
 - Explain what it does.
 - Point out any security issues (e.g., unsafe input, DoS risk).
 - Suggest improvements.
+Language: {language}
 Code:
 {code}
     """
 
+async def _generate_analysis(adapter: BaseAdapter, prompt: str, model: str) -> str:
     try:
-        llm_response = query_model(model, prompt)  # could return dict or string
+        return await adapter.agenerate(prompt, model=model)
+    except Exception as e:
+        return f"[Error generating analysis] {str(e)}"
 
-        # 🧠 Handle both dict and string responses safely
-        if isinstance(llm_response, dict):
-            # try extracting the text part
-            llm_response_text = llm_response.get("response") or llm_response.get("text") or str(llm_response)
-        else:
-            llm_response_text = str(llm_response)
+async def analyze_code(language: str, code: str, adapter: BaseAdapter, model: str = "llama3"):
+    """
+    Analyze code using the LLM and also run/compile it.
+    The LLM call and the compile/run don't depend on each other, so both run concurrently.
+    Returns structured JSON with analysis, compile output, run output, and exit code.
+    """
+    prompt = _ANALYZER_TMPL.format_map({"language": language, "code": code})
 
-    except Exception as e:
-        llm_response_text = f"[Error generating analysis] {str(e)}"
+    llm_response_text, run_result = await asyncio.gather(
+        _generate_analysis(adapter, prompt, model),
+        run_code(language, code),
+    )
 
     # Parse structured analysis
     structured_analysis = parse_analysis_response(llm_response_text)
 
-    # Compile or run the code
-    run_result = run_code(language, code)
-
     return {
         "analysis": structured_analysis,
         "compile_output": run_result.get("compile_output", ""),
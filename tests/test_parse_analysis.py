@@ -0,0 +1,61 @@
+from app.utils import parse_analysis_response
+
+
+def test_plain_headers():
+    text = (
+        "Intro text\n"
+        "**What it does:**\n"
+        "This prints hello.\n"
+        "  It also loops.\n\n"
+        "**Security issues:**\n"
+        "* No input validation\n"
+        "- DoS risk via loop\n"
+        "Plain line\n\n"
+        "**Suggestions for improvement:**\n"
+        "1. Add validation\n"
+        "2. Use logging\n"
+    )
+    assert parse_analysis_response(text) == {
+        "what_it_does": "This prints hello. It also loops.",
+        "security_issues": ["No input validation", "DoS risk via loop", "Plain line"],
+        "suggestions": ["Add validation", "Use logging"],
+    }
+
+
+def test_bulleted_headers():
+    text = (
+        "- **What it does:** Prints hello.\n"
+        "- **Security issues:**\n"
+        "  - None found\n"
+        "- **Improvement suggestions:**\n"
+        "  - Add a main guard\n"
+    )
+    assert parse_analysis_response(text) == {
+        "what_it_does": "Prints hello.",
+        "security_issues": ["None found"],
+        "suggestions": ["Add a main guard"],
+    }
+
+
+def test_numbered_headers():
+    text = (
+        "1. **What it does:**\n"
+        "Reads a file.\n"
+        "2. **Security issues:**\n"
+        "* Path traversal\n"
+        "3. **Suggestions for improvement:**\n"
+        "* Validate the path\n"
+    )
+    assert parse_analysis_response(text) == {
+        "what_it_does": "Reads a file.",
+        "security_issues": ["Path traversal"],
+        "suggestions": ["Validate the path"],
+    }
+
+
+def test_no_sections():
+    assert parse_analysis_response("nothing here") == {
+        "what_it_does": "",
+        "security_issues": [],
+        "suggestions": [],
+    }